@@ -34,6 +34,7 @@ geompy = geomBuilder.New(salome.myStudy)
 
 
 from MyGeom.Types import *
+from MyGeom.Types import _register
 
 from numpy import array, ndarray
 from numpy import float64 as data_type
@@ -69,7 +70,7 @@ def explode_sub_shape(my_geom_object,type,add_to_study = True):
     faces = explode_sub_shape(shell,"FACE",add_to_study = False)
     """
     geom_object = my_geom_object.geomObject
-    subshapes = geompy.SubShapeAll(geom_object,geompy.ShapeType[type])
+    subshapes = [_register(sub) for sub in geompy.SubShapeAll(geom_object,geompy.ShapeType[type])]
     if add_to_study:
         for sub in subshapes:
             name = geompy.SubShapeName(sub,geom_object)
@@ -115,16 +116,16 @@ def create_face_by_points(points,isPlanarFace = True):
     Takes a set of points and creates a face with it
     """
     # Create wires in u direction
-    wires = [geompy.MakeInterpol(coords) for coords in points]
+    wires = [_register(geompy.MakeInterpol(coords)) for coords in points]
 
     # Transpose list 
     points2 = array(points).transpose()
     points2 = points2.tolist()
 
     # Create wires in v direction
-    wires += [geompy.MakeInterpol(coords) for coords in points2]
+    wires += [_register(geompy.MakeInterpol(coords)) for coords in points2]
     
-    face = MyGeomObject(geompy.MakeFaceWires(wires,isPlanarFace))
+    face = MyGeomObject(_register(geompy.MakeFaceWires(wires,isPlanarFace)))
     face = explode_sub_shape(face,"FACE")[0]
     return MyFace(face)
 
@@ -29,13 +29,157 @@ import GEOM
 from salome.geom import geomBuilder
 geompy = geomBuilder.New(salome.myStudy)
 
-from numpy import array, ndarray, arange
+from numpy import array, ndarray, arange, linspace, floor, clip, sqrt
+from numpy import concatenate, cumsum, interp, zeros, generic, unique, vstack
+from numpy import ones, where, maximum
 from numpy import float64 as data_type
 
+from collections import OrderedDict
+from itertools import product, count
+
 # For future Versions of salome!
 # from salome.geom import geomBuilder
 # geompy = geomBuilder.New(salome.myStudy)
 
+# Bookkeeping for temporary objects created by MyGeom.
+# Every object made by the kernel through this module is passed through
+# _register, which hands it to the innermost active MyGeomArena (if any).
+_active_arenas = []
+_object_statistics = {"created" : 0, "released" : 0}
+
+def _register(geom_object):
+    """
+    Registers a freshly created GEOM object with the innermost active arena
+    and returns it unchanged.
+    """
+    _object_statistics["created"] += 1
+    if _active_arenas:
+        _active_arenas[-1].track(geom_object)
+    return geom_object
+
+def _keep_in_active_arenas(my_object):
+    """
+    Keeps an object in all active arenas. Used for objects which are
+    held by MyGeom itself and have to outlive the current scope.
+    """
+    for arena in _active_arenas:
+        arena.keep(my_object)
+
+def get_live_object_count():
+    """
+    Returns the number of objects created through MyGeom which
+    were not released by an arena yet.
+    """
+    return _object_statistics["created"] - _object_statistics["released"]
+
+class MyGeomArena(object):
+    """
+    Scope which records all objects created through MyGeom and releases
+    every object that was neither published to the study nor kept when
+    the scope is left.
+
+    Arenas can be nested. Objects kept in an inner arena are handed to
+    the enclosing arena, which decides about them on its own exit.
+
+    Examples
+    --------
+    with MyGeomArena() as arena:
+        face = create_face_by_points(points)
+        arena.keep(face)
+    """
+
+    def __init__(self):
+        self._tracked = {}
+        self._kept = set()
+
+    def __enter__(self):
+        _active_arenas.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active_arenas.remove(self)
+        self.release()
+        return False
+
+    def _getKey(self,geom_object):
+        return geom_object.GetEntry()
+
+    def track(self,geom_object):
+        """
+        Records a GEOM object in this arena
+        """
+        self._tracked[self._getKey(geom_object)] = geom_object
+
+    def keep(self,*objects):
+        """
+        Marks objects as survivors of this arena. MyGeomObject instances
+        are kept together with all MyGeomObject instances they hold,
+        e.g. the end points of a MyLine. Sub shapes are kept together
+        with their main shape.
+        """
+        for my_object in objects:
+            if isinstance(my_object,MyGeomObject):
+                self.keep(my_object.getGeomObject())
+                for attribute in vars(my_object).values():
+                    if isinstance(attribute,MyGeomObject):
+                        self.keep(attribute)
+                    elif isinstance(attribute,list) or isinstance(attribute,tuple):
+                        self.keep(*attribute)
+                    elif isinstance(attribute,dict):
+                        self.keep(*attribute.values())
+            elif isinstance(my_object,list) or isinstance(my_object,tuple):
+                self.keep(*my_object)
+            elif isinstance(my_object,GEOM._objref_GEOM_Object):
+                self._kept.add(self._getKey(my_object))
+                # sub shapes refer to their main shape
+                if not my_object.IsMainShape():
+                    self.keep(my_object.GetMainShape())
+
+    def getLiveCount(self):
+        """
+        Returns the number of objects currently tracked by this arena
+        """
+        return len(self._tracked)
+
+    def getLiveCountByType(self):
+        """
+        Returns a dictionary with the number of tracked objects
+        for each shape type
+        """
+        counts = {}
+        for geom_object in self._tracked.values():
+            shape_type = str(geom_object.GetShapeType())
+            counts[shape_type] = counts.get(shape_type,0) + 1
+        return counts
+
+    def release(self):
+        """
+        Removes all tracked objects from the GEOM engine, except published
+        and kept ones. Kept objects are passed on to the enclosing arena.
+        Returns the number of released objects.
+        """
+        # the enclosing arena is the one below this arena, or the innermost
+        # one if this arena was already left
+        if self in _active_arenas:
+            index = _active_arenas.index(self)
+            enclosing = _active_arenas[index - 1] if index > 0 else None
+        else:
+            enclosing = _active_arenas[-1] if _active_arenas else None
+
+        released = 0
+        for key, geom_object in self._tracked.items():
+            if key in self._kept:
+                if enclosing is not None:
+                    enclosing.track(geom_object)
+            elif not geom_object.GetStudyEntry():
+                geompy.RemoveObject(geom_object)
+                released += 1
+
+        _object_statistics["released"] += released
+        self._tracked = {}
+        self._kept = set()
+        return released
+
 # Define help classes for more structured programming
 class MyGeomObject(object):
     """
@@ -91,13 +235,13 @@ class MyVertex(MyGeomObject):
         elif isinstance(x,ndarray) or isinstance(x,tuple) or isinstance(x,list):
             if len(x) is 3:
                 self.setCoord(data_type(x))
-                self.setGeomObject(geompy.MakeVertex(x[0],x[1],x[2]))
+                self.setGeomObject(_register(geompy.MakeVertex(x[0],x[1],x[2])))
             else:
                 raise ValueError("Error: Wrong Dimension!")
         else:
             try:
                 self.setCoord((x,y,z))
-                self.setGeomObject(geompy.MakeVertex(x,y,z))
+                self.setGeomObject(_register(geompy.MakeVertex(x,y,z)))
             except Exception:
                 raise ValueError("Error: Wrong data type!")
 
@@ -157,7 +301,7 @@ class MyLine(MyGeomObject):
         if isinstance(line_or_point,GEOM._objref_GEOM_Object):
             type = geompy.ShapeIdToType(line_or_point.GetType())
             if type == 'LINE' and q is None:
-                subshapes = geompy.SubShapeAll(line_or_point,geompy.ShapeType['VERTEX'])
+                subshapes = [_register(sub) for sub in geompy.SubShapeAll(line_or_point,geompy.ShapeType['VERTEX'])]
                 line_or_point = subshapes[0]
                 q = subshapes[-1]
             elif type == 'LINE' and q is not None:
@@ -166,7 +310,7 @@ class MyLine(MyGeomObject):
         self.setP(line_or_point)
         self.setQ(q)
         
-        self.geomObject = geompy.MakeLineTwoPnt(self.getP().getGeomObject(),self.getQ().getGeomObject())
+        self.geomObject = _register(geompy.MakeLineTwoPnt(self.getP().getGeomObject(),self.getQ().getGeomObject()))
 
         
     def getP(self):
@@ -224,7 +368,7 @@ class MyVector(MyGeomObject):
                 self.setQ(MyVertex(vec_or_point))
                 self.setP(MyVertex(0.0))
             elif p_type == 'VECTOR':
-                subshapes = geompy.SubShapeAll(vec_or_point,geompy.ShapeType['VERTEX'])
+                subshapes = [_register(sub) for sub in geompy.SubShapeAll(vec_or_point,geompy.ShapeType['VERTEX'])]
                 self.setP(subshapes[0])
                 self.setQ(subshapes[-1])
             else:
@@ -249,7 +393,7 @@ class MyVector(MyGeomObject):
             raise ValueError('Error: Wrong Type!')
 
         
-        self.geomObject = geompy.MakeVector(self.getP().getGeomObject(),self.getQ().getGeomObject())
+        self.geomObject = _register(geompy.MakeVector(self.getP().getGeomObject(),self.getQ().getGeomObject()))
 
         
     def getP(self):
@@ -292,19 +436,178 @@ class MyWire(MyGeomObject):
         """
         Init function for wire creation
         """
+        self._points = None
+        self._kind = None
+        self._closed = False
+
         if isinstance(wire_or_edges,MyWire):
             self.setGeomObject(wire_or_edges.getGeomObject())
+            self._points = wire_or_edges._points
+            self._kind = wire_or_edges._kind
+            self._closed = wire_or_edges._closed
         elif isinstance(wire_or_edges,list) or isinstance(wire_or_edges,tuple):
-            self.setGeomObject(geompy.MakeWire(wire_or_edges))
+            edges = [edge.getGeomObject() if isinstance(edge,MyGeomObject) else edge
+                     for edge in wire_or_edges]
+            self.setGeomObject(_register(geompy.MakeWire(edges)))
         elif isinstance(wire_or_edges,GEOM._objref_GEOM_Object):
-            type = geompy.ShapeIdToType(wire_or_edges.GetType())
-            if type == 'WIRE':
+            if wire_or_edges.GetShapeType() == GEOM.WIRE:
                 self.setGeomObject(wire_or_edges)
             else:
                 raise ValueError("Error: Wrong data type!")
         else:
             raise ValueError("Error: Wrong data type!")
-        
+
+    @classmethod
+    def fromPoints(cls,points,closed = False,kind = "polyline"):
+        """
+        Creates a wire from an array of points. Every point is turned
+        into a vertex once, and the edges are created in a single
+        kernel call. The coordinates are stored in the wire, so length
+        and sampling of polylines are computed without the kernel.
+
+        Parameters
+        ----------
+        points : array of shape (N,3)
+        closed : bool
+                 If True the last point is connected with the first one.
+                 Needs at least 3 distinct points, otherwise 2.
+                 Consecutive points must be distinct.
+        kind : "polyline" or "interpolated"
+
+        Returns
+        -------
+        MyWire instance
+
+        Examples
+        --------
+        profile = MyWire.fromPoints(loadtxt("profile.csv",delimiter=","))
+        """
+        points = array(points,dtype=data_type)
+        if points.ndim != 2 or points.shape[1] != 3 or len(points) < 2:
+            raise ValueError("Error: Wrong Dimension!")
+        if closed:
+            if all(points[0] == points[-1]):
+                points = points[:-1]
+            if len(unique(points,axis=0)) < 3:
+                raise ValueError("Error: A closed wire needs at least 3 distinct points!")
+        elif len(unique(points,axis=0)) < 2:
+            raise ValueError("Error: A wire needs at least 2 distinct points!")
+        if (points[1:] == points[:-1]).all(1).any():
+            raise ValueError("Error: Consecutive points must be distinct!")
+
+        vertices = [_register(geompy.MakeVertex(x,y,z)) for x, y, z in points]
+
+        if kind == "polyline":
+            curve = _register(geompy.MakePolyline(vertices,closed))
+        elif kind == "interpolated":
+            curve = _register(geompy.MakeInterpol(vertices,closed))
+        else:
+            raise ValueError("Error: Unknown kind of wire!")
+
+        if curve.GetShapeType() != GEOM.WIRE:
+            curve = _register(geompy.MakeWire([curve]))
+
+        wire = cls(curve)
+        wire._points = points
+        wire._kind = kind
+        wire._closed = closed
+        return wire
+
+    def getPoints(self):
+        """
+        Returns the array of points the wire was created from, or None
+        """
+        return self._points
+
+    def isClosed(self):
+        return self._closed
+
+    def _getPolylinePoints(self):
+        if self._closed:
+            return vstack((self._points,self._points[:1]))
+        return self._points
+
+    def getLength(self):
+        """
+        Returns length of the wire. For polylines created by fromPoints
+        the length is computed from the stored coordinates.
+        """
+        if self._kind == "polyline":
+            polyline = self._getPolylinePoints()
+            segments = polyline[1:] - polyline[:-1]
+            return sqrt((segments**2).sum(1)).sum()
+        return geompy.BasicProperties(self.getGeomObject())[0]
+
+    def samplePoints(self,nr_points):
+        """
+        Returns an array of shape (nr_points,3) with points which are
+        equally distributed by arc length along the wire. For polylines
+        created by fromPoints the points are computed from the stored
+        coordinates.
+        """
+        lengths = linspace(0.0,self.getLength(),nr_points)
+
+        if self._kind == "polyline":
+            polyline = self._getPolylinePoints()
+            segments = polyline[1:] - polyline[:-1]
+            arc_length = concatenate(([0.0],cumsum(sqrt((segments**2).sum(1)))))
+            return array([interp(lengths,arc_length,polyline[:,k]) for k in range(3)],
+                         dtype=data_type).transpose()
+
+        # the vertices are only needed for their coordinates
+        with MyGeomArena():
+            edges = self._getOrderedEdges()
+            edge_lengths = [geompy.BasicProperties(edge)[0] for edge, start in edges]
+            sampled = []
+            for length in lengths:
+                index = 0
+                while index < len(edges) - 1 and length > edge_lengths[index]:
+                    length -= edge_lengths[index]
+                    index += 1
+                length = min(length,edge_lengths[index])
+                edge, start = edges[index]
+                vertex = _register(geompy.MakeVertexOnCurveByLength(edge,length,start))
+                sampled.append(geompy.PointCoordinates(vertex))
+        return array(sampled,dtype=data_type)
+
+    def _getOrderedEdges(self,tolerance = 1e-7):
+        """
+        Returns the edges of the wire in the order they are connected,
+        each together with the vertex where it is entered. Has to be
+        called inside an arena.
+        """
+        edges = []
+        for edge in geompy.SubShapeAll(self.getGeomObject(),geompy.ShapeType["EDGE"]):
+            edge = _register(edge)
+            vertices = [_register(vertex) for vertex in geompy.SubShapeAll(edge,geompy.ShapeType["VERTEX"])]
+            coords = [array(geompy.PointCoordinates(vertex),dtype=data_type) for vertex in vertices]
+            edges.append((edge, vertices, coords))
+
+        def is_close(p,q):
+            return sqrt(((p - q)**2).sum()) < tolerance
+
+        # an open wire starts at an end point which belongs to one edge only
+        end_points = [coord for edge, vertices, coords in edges for coord in coords
+                      if sum(is_close(coord,other) for e, v, others in edges for other in others) == 1]
+        start_coord = end_points[0] if end_points else edges[0][2][0]
+
+        ordered = []
+        unused = list(edges)
+        while unused:
+            for index, (edge, vertices, coords) in enumerate(unused):
+                matches = [k for k, coord in enumerate(coords) if is_close(coord,start_coord)]
+                if matches:
+                    break
+            else:
+                raise ValueError("Error: Wire is not connected!")
+            del unused[index]
+            k = matches[0]
+            ordered.append((edge, vertices[k]))
+            # continue at the other end of the edge
+            start_coord = coords[-1 - k]
+
+        return ordered
+
 class MyFace(MyGeomObject):
     """
     Help class for faces, and face related stuff
@@ -321,8 +624,8 @@ class MyFace(MyGeomObject):
         if isinstance(face,MyFace):
             self.setGeomObject(face.getGeomObject())
         elif isinstance(face,MyWire):
-            compound = geompy.MakeFaceWires([face.getGeomObject()],isPlanarFace)
-            new_face = geompy.SubShapeAll(compound,geompy.ShapeType["FACE"])[0]
+            compound = _register(geompy.MakeFaceWires([face.getGeomObject()],isPlanarFace))
+            new_face = _register(geompy.SubShapeAll(compound,geompy.ShapeType["FACE"])[0])
             self.setGeomObject(new_face)
         elif isinstance(face,GEOM._objref_GEOM_Object):
             if face.GetShapeType() == GEOM.FACE:
@@ -352,9 +655,9 @@ class MyFace(MyGeomObject):
         
         """
         if make_copy:
-            return MyFace(geompy.ChangeOrientation(self.geomObject))
+            return MyFace(_register(geompy.ChangeOrientation(self.geomObject)))
         else:
-            self.geomObject = geompy.ChangeOrientation(self.geomObject) 
+            self.geomObject = _register(geompy.ChangeOrientation(self.geomObject))
 
     def makeVertexOnSurface(self,u,v = None):
         """
@@ -376,13 +679,13 @@ class MyFace(MyGeomObject):
 
             if isinstance(u,ndarray) or isinstance(u,list) or isinstance(u,tuple):
                 if len(u) is 2:
-                    return MyVertex(geompy.MakeVertexOnSurface(self.geomObject,u[0],u[1]))
+                    return MyVertex(_register(geompy.MakeVertexOnSurface(self.geomObject,u[0],u[1])))
                 else:
                     raise ValueError("Error: List has wrong dimension!")
             else:
                 raise ValueError("Error: Wrong data type!")
         else:
-            return MyVertex(geompy.MakeVertexOnSurface(self.geomObject,u,v))
+            return MyVertex(_register(geompy.MakeVertexOnSurface(self.geomObject,u,v)))
 
     def getNormal(self, p = None):
         """
@@ -399,10 +702,10 @@ class MyFace(MyGeomObject):
         MyVector instance which holds the normal of the face.
         """
         if p is None:                    
-            normal = geompy.GetNormal(self.getGeomObject())
+            normal = _register(geompy.GetNormal(self.getGeomObject()))
         else:
             my_p = MyVertex(p)
-            normal = geompy.GetNormal(self.getGeomObject(),my_p.getGeomObject())
+            normal = _register(geompy.GetNormal(self.getGeomObject(),my_p.getGeomObject()))
 
         return MyVector(normal)
 
@@ -482,6 +785,302 @@ class MyFace(MyGeomObject):
         """
         return geompy.BasicProperties(self.getGeomObject())[1]
 
+    def _getParametricGrid(self,resolution):
+        """
+        Returns an array of shape (resolution+1,resolution+1,3) with the
+        points of the face on an equidistant grid in local coordinates.
+        The grid is evaluated once per resolution and cached as long as
+        the underlying geom object does not change.
+        """
+        if not hasattr(self,"_parametric_grids"):
+            self._parametric_grids = {}
+
+        cached = self._parametric_grids.get(resolution)
+        if cached is not None and cached[0] is self.getGeomObject():
+            return cached[1]
+
+        parameters = linspace(0.0,1.0,resolution + 1)
+        # the vertices are only needed for their coordinates
+        with MyGeomArena():
+            grid = array([[self.makeVertexOnSurface(u,v).getCoord()
+                           for v in parameters] for u in parameters],
+                         dtype=data_type)
+
+        self._parametric_grids[resolution] = (self.getGeomObject(), grid)
+        return grid
+
+    def _interpolateParametricGrid(self,grid,u,v):
+        """
+        Evaluates the bilinear interpolation of a parametric grid and
+        its partial derivatives at the local coordinates u and v.
+        """
+        resolution = grid.shape[0] - 1
+        su = u*resolution
+        sv = v*resolution
+        i = clip(floor(su).astype(int),0,resolution - 1)
+        j = clip(floor(sv).astype(int),0,resolution - 1)
+        a = (su - i)[:,None]
+        b = (sv - j)[:,None]
+
+        p00 = grid[i,j]
+        p10 = grid[i+1,j]
+        p01 = grid[i,j+1]
+        p11 = grid[i+1,j+1]
+
+        point = (1-a)*(1-b)*p00 + a*(1-b)*p10 + (1-a)*b*p01 + a*b*p11
+        d_u = resolution*((1-b)*(p10 - p00) + b*(p11 - p01))
+        d_v = resolution*((1-a)*(p01 - p00) + a*(p11 - p10))
+        return point, d_u, d_v
+
+    def _projectOnParametricGrid(self,grid,points,iterations,tolerance):
+        """
+        Returns the local coordinates of the projections of points onto
+        the bilinear interpolation of a parametric grid. Every point is
+        seeded with the nearest grid node and refined with damped
+        Gauss-Newton iterations, which only accept steps that reduce
+        the residual.
+        """
+        resolution = grid.shape[0] - 1
+        nodes = grid.reshape(-1,3)
+
+        # seed with the nearest grid node
+        distances = ((points**2).sum(1)[:,None] - 2.0*points.dot(nodes.T)
+                     + (nodes**2).sum(1)[None,:])
+        i, j = divmod(distances.argmin(1),resolution + 1)
+        u = i/data_type(resolution)
+        v = j/data_type(resolution)
+
+        point, d_u, d_v = self._interpolateParametricGrid(grid,u,v)
+        residual = point - points
+        error = (residual**2).sum(1)
+
+        for iteration in range(iterations):
+            a11 = (d_u*d_u).sum(1)
+            a12 = (d_u*d_v).sum(1)
+            a22 = (d_v*d_v).sum(1)
+            g1 = (d_u*residual).sum(1)
+            g2 = (d_v*residual).sum(1)
+
+            det = a11*a22 - a12*a12
+            regular = det > 1e-14*(a11*a22 + 1e-300)
+            det[~regular] = 1.0
+            delta_u = -(a22*g1 - a12*g2)/det
+            delta_v = -(a11*g2 - a12*g1)/det
+            delta_u[~regular] = 0.0
+            delta_v[~regular] = 0.0
+
+            # halve the step until the residual decreases
+            new_u = u.copy()
+            new_v = v.copy()
+            pending = regular.copy()
+            damping = 1.0
+            for halving in range(30):
+                if not pending.any():
+                    break
+                trial_u = clip(u[pending] + damping*delta_u[pending],0.0,1.0)
+                trial_v = clip(v[pending] + damping*delta_v[pending],0.0,1.0)
+                trial_point = self._interpolateParametricGrid(grid,trial_u,trial_v)[0]
+                trial_error = ((trial_point - points[pending])**2).sum(1)
+                accepted = trial_error < error[pending]
+                indices = pending.nonzero()[0][accepted]
+                new_u[indices] = trial_u[accepted]
+                new_v[indices] = trial_v[accepted]
+                pending[indices] = False
+                damping *= 0.5
+
+            step = max(abs(new_u - u).max(),abs(new_v - v).max())
+            u = new_u
+            v = new_v
+            if step < tolerance:
+                break
+
+            point, d_u, d_v = self._interpolateParametricGrid(grid,u,v)
+            residual = point - points
+            error = (residual**2).sum(1)
+
+        return u, v
+
+    def _evaluateSurface(self,u,v):
+        """
+        Returns an array of shape (N,3) with the points of the face at
+        the local coordinates u and v. Has to be called inside an arena,
+        since the vertices are only needed for their coordinates.
+        """
+        return array([self.makeVertexOnSurface(u_i,v_i).getCoord() for u_i, v_i in zip(u,v)],
+                     dtype=data_type).reshape(-1,3)
+
+    def _getStencil(self,t,step_size):
+        """
+        Returns offsets a and b, in units of step_size, of a three point
+        stencil 0, a, b around the local coordinates t which stays inside
+        [0,1]: central where possible, one sided at the boundaries.
+        """
+        a = -ones(len(t))
+        b = ones(len(t))
+        forward = t - step_size < 0.0
+        backward = t + step_size > 1.0
+        a[forward] = 1.0
+        b[forward] = 2.0
+        b[backward] = -2.0
+        return a, b
+
+    def _differentiate(self,f0,fa,fb,a,b,step_size):
+        """
+        Returns first and second derivative at 0 of the quadratic
+        interpolation of the values f0, fa, fb at 0, a, b.
+        """
+        a = a[:,None]
+        b = b[:,None]
+        first = (-(1.0/a + 1.0/b)*f0 + b/(a*(b - a))*fa - a/(b*(b - a))*fb)/step_size
+        second = 2.0*(f0/(a*b) + fa/(a*(a - b)) + fb/(b*(b - a)))/step_size**2
+        return first, second
+
+    def _refineOnSurface(self,points,u,v,iterations,tolerance,step_size = 1e-5):
+        """
+        Refines local coordinates of projections with damped Newton
+        iterations on the face itself. The derivatives are approximated
+        by finite differences, so every iteration evaluates the face
+        five times per point, plus once per trial step.
+        Returns u, v and the points of the face at u and v.
+        """
+        point = self._evaluateSurface(u,v)
+        error = ((point - points)**2).sum(1)
+        active = ones(len(points),dtype=bool)
+
+        for iteration in range(iterations):
+            if not active.any():
+                break
+            indices = active.nonzero()[0]
+            u_a = u[indices]
+            v_a = v[indices]
+            p_a = point[indices]
+            residual = p_a - points[indices]
+
+            a_u, b_u = self._getStencil(u_a,step_size)
+            a_v, b_v = self._getStencil(v_a,step_size)
+            fa_u = self._evaluateSurface(u_a + a_u*step_size,v_a)
+            fb_u = self._evaluateSurface(u_a + b_u*step_size,v_a)
+            fa_v = self._evaluateSurface(u_a,v_a + a_v*step_size)
+            fb_v = self._evaluateSurface(u_a,v_a + b_v*step_size)
+            f_uv = self._evaluateSurface(u_a + a_u*step_size,v_a + a_v*step_size)
+            d_u, d_uu = self._differentiate(p_a,fa_u,fb_u,a_u,b_u,step_size)
+            d_v, d_vv = self._differentiate(p_a,fa_v,fb_v,a_v,b_v,step_size)
+            d_uv = (f_uv - fa_u - fa_v + p_a)/((a_u*a_v)[:,None]*step_size**2)
+
+            g1 = (d_u*residual).sum(1)
+            g2 = (d_v*residual).sum(1)
+            # Gauss-Newton matrix, completed by the curvature terms
+            # where this keeps it positive definite
+            a11 = (d_u*d_u).sum(1)
+            a12 = (d_u*d_v).sum(1)
+            a22 = (d_v*d_v).sum(1)
+            h11 = a11 + (d_uu*residual).sum(1)
+            h12 = a12 + (d_uv*residual).sum(1)
+            h22 = a22 + (d_vv*residual).sum(1)
+            newton = (h11 > 0.0) & (h11*h22 - h12*h12 > 0.0)
+            a11 = where(newton,h11,a11)
+            a12 = where(newton,h12,a12)
+            a22 = where(newton,h22,a22)
+
+            det = a11*a22 - a12*a12
+            regular = det > 1e-14*(a11*a22 + 1e-300)
+            det[~regular] = 1.0
+            delta_u = -(a22*g1 - a12*g2)/det
+            delta_v = -(a11*g2 - a12*g1)/det
+
+            # halve the step until the residual decreases
+            pending = regular.copy()
+            damping = 1.0
+            for halving in range(10):
+                if not pending.any():
+                    break
+                trial_u = clip(u_a[pending] + damping*delta_u[pending],0.0,1.0)
+                trial_v = clip(v_a[pending] + damping*delta_v[pending],0.0,1.0)
+                trial_point = self._evaluateSurface(trial_u,trial_v)
+                targets = indices[pending]
+                trial_error = ((trial_point - points[targets])**2).sum(1)
+                accepted = trial_error < error[targets]
+                accepted_targets = targets[accepted]
+                step = maximum(abs(trial_u - u[targets]),abs(trial_v - v[targets]))[accepted]
+                u[accepted_targets] = trial_u[accepted]
+                v[accepted_targets] = trial_v[accepted]
+                point[accepted_targets] = trial_point[accepted]
+                error[accepted_targets] = trial_error[accepted]
+                # converged points stop
+                active[accepted_targets[step < tolerance]] = False
+                pending[pending.nonzero()[0][accepted]] = False
+                damping *= 0.5
+
+            # points which can not be improved any more stop
+            active[indices[pending]] = False
+            active[indices[~regular]] = False
+
+        return u, v, point
+
+    def project(self,points,resolution = 32,iterations = 20,tolerance = 1e-9,
+                surface_iterations = 3,chunk_size = 1024):
+        """
+        Projects a set of points onto the face.
+
+        Every point is seeded with the closest point of a cached
+        parametric grid and refined with damped Gauss-Newton iterations
+        on the bilinear interpolation of the grid, which are done for all
+        points of a chunk at once. Without the kernel this gives the local
+        coordinates up to the interpolation error of the grid, which is
+        of order (1/resolution)**2 times the curvature of the face.
+        Afterwards Newton iterations are continued on the face itself,
+        which costs about six evaluations of the face per point and
+        iteration.
+
+        Parameters
+        ----------
+        points : array of shape (N,3) or a single point
+        resolution : Nr of grid cells in each local direction
+        iterations : Maximal number of Newton iterations on the grid
+        tolerance : Stopping criterion for the parameter update
+        surface_iterations : Maximal number of Newton iterations on the
+                             face. If 0 the face is not evaluated at all,
+                             and projected points and distances refer to
+                             the interpolation of the grid.
+        chunk_size : Nr of points which are processed at once
+
+        Returns
+        -------
+        uv : array of shape (N,2) with the local coordinates
+        projected : array of shape (N,3) with the projected points
+        distances : array of shape (N,) with the distances to the face
+
+        Examples
+        --------
+        uv, projected, distances = face.project(measured_points)
+        """
+        points = array(points,dtype=data_type)
+        if points.ndim == 1:
+            points = points.reshape(1,-1)
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError("Error: Wrong Dimension!")
+        if len(points) == 0:
+            return zeros((0,2),dtype=data_type), zeros((0,3),dtype=data_type), zeros(0,dtype=data_type)
+
+        grid = self._getParametricGrid(resolution)
+
+        uv = zeros((len(points),2),dtype=data_type)
+        projected = zeros((len(points),3),dtype=data_type)
+        for start in range(0,len(points),chunk_size):
+            chunk = points[start:start + chunk_size]
+            u, v = self._projectOnParametricGrid(grid,chunk,iterations,tolerance)
+            if surface_iterations > 0:
+                with MyGeomArena():
+                    u, v, point = self._refineOnSurface(chunk,u,v,surface_iterations,tolerance)
+            else:
+                point = self._interpolateParametricGrid(grid,u,v)[0]
+            uv[start:start + chunk_size,0] = u
+            uv[start:start + chunk_size,1] = v
+            projected[start:start + chunk_size] = point
+
+        distances = sqrt(((projected - points)**2).sum(1))
+        return uv, projected, distances
+
 
 class MyQuadrangleFromLines(MyFace):
     """
@@ -490,31 +1089,418 @@ class MyQuadrangleFromLines(MyFace):
     """
 
     def __init__(self,edges):
-        self.geomObject = geompy.MakeFaceWires(
-            [edge.geomObject for edge in edges],1)
+        self.geomObject = _register(geompy.MakeFaceWires(
+            [edge.geomObject for edge in edges],1))
         self.edges = edges
  
 
 class MyShell(MyGeomObject):
     """
-    Help class for shell creation and handling
+    Help class for shell creation and handling.
+
+    Shells can be assembled incrementally with addFaces and removeFaces.
+    Faces are indexed by their area and the center of their bounding
+    box, so duplicates are rejected by comparing only with faces of
+    nearby keys. The kernel shell is built when it is needed the next
+    time. A shell without faces has None as geom object.
     """
 
-    def __init__(self,face_list_or_shell):
+    def __init__(self,face_list_or_shell = None, key_digits = 6):
         """
         creates from a list of faces a shell
+        key_digits : Nr of decimal digits up to which the area and
+                     bounding box of faces are compared in the index
         """
-        if isinstance(face_list_or_shell,MyShell):
-            self.setGeomObject(face_list_or_shell.getGeomObject())  
+        self._key_tolerance = 10.0**(-key_digits)
+        self._faces = OrderedDict()
+        self._face_index = {}
+        self._modified = False
+        self._geomObject = None
+
+        if face_list_or_shell is None:
+            pass
+        elif isinstance(face_list_or_shell,MyShell):
+            if face_list_or_shell._face_index is None:
+                # the faces of the source are not exploded yet
+                self.setGeomObject(face_list_or_shell.getGeomObject())
+                self._face_index = None
+            elif face_list_or_shell._key_tolerance == self._key_tolerance:
+                self.setGeomObject(face_list_or_shell.getGeomObject())
+                self._faces = OrderedDict(face_list_or_shell._faces)
+                self._face_index = dict((key, list(bucket)) for key, bucket
+                                        in face_list_or_shell._face_index.items())
+            else:
+                self.addFaces(face_list_or_shell.getFaces())
         elif isinstance(face_list_or_shell,GEOM._objref_GEOM_Object):
             if face_list_or_shell.GetShapeType() == GEOM.SHELL:
                 self.setGeomObject(face_list_or_shell)
+                self._face_index = None
         elif isinstance(face_list_or_shell,list):
-            #To guarantee that we have the correct data type
-            my_face_list = [ MyFace(face) for face in face_list_or_shell]
-        
-            my_face_list = [face.getGeomObject() for face in my_face_list]
-            self.geomObject = geompy.MakeShell(my_face_list)
+            self.addFaces(face_list_or_shell)
         else:
             raise ValueError("Error: Wrong data type!")
 
+    def _getFaceValues(self,face):
+        """
+        Returns area and center of the bounding box of a face,
+        scaled such that index cells have twice the key tolerance as width
+        """
+        geom_object = face.getGeomObject()
+        area = geompy.BasicProperties(geom_object)[1]
+        x_min, x_max, y_min, y_max, z_min, z_max = geompy.BoundingBox(geom_object)
+        values = (area, 0.5*(x_min + x_max), 0.5*(y_min + y_max), 0.5*(z_min + z_max))
+        return [value/(2.0*self._key_tolerance) for value in values]
+
+    def _getFaceKey(self,face):
+        return tuple(int(floor(value)) for value in self._getFaceValues(face))
+
+    def _getNeighbourKeys(self,face):
+        """
+        Returns all keys a face within the key tolerance can have. Since
+        the cells are twice as wide as the tolerance only the neighbour
+        on the nearer side has to be probed in each component.
+        """
+        candidates = []
+        for value in self._getFaceValues(face):
+            cell = int(floor(value))
+            if value - cell < 0.5:
+                candidates.append((cell, cell - 1))
+            else:
+                candidates.append((cell, cell + 1))
+        return product(*candidates)
+
+    def _getFaceIndex(self):
+        """
+        Returns the face index. If the shell was given as geom object
+        the index is created from its faces first.
+        """
+        if self._face_index is None:
+            self._face_index = {}
+            if self._geomObject is None:
+                return self._face_index
+            faces = [_register(face) for face in geompy.SubShapeAll(self._geomObject,geompy.ShapeType["FACE"])]
+            # the index holds the faces beyond the current arena
+            _keep_in_active_arenas(faces)
+            for face in faces:
+                my_face = MyFace(face)
+                self._face_index.setdefault(self._getFaceKey(my_face),[]).append(my_face)
+                self._faces[id(my_face)] = my_face
+        return self._face_index
+
+    def _findFace(self,face):
+        """
+        Returns key and position in the bucket of a face of the shell
+        which is equal to face, or None
+        """
+        face_index = self._getFaceIndex()
+        # the vertices and normals of the comparison are not needed afterwards
+        with MyGeomArena():
+            for key in self._getNeighbourKeys(face):
+                for index, other in enumerate(face_index.get(key,[])):
+                    if face == other:
+                        return key, index
+        return None
+
+    def addFaces(self,faces):
+        """
+        Adds faces to the shell. Faces which are already part of the shell
+        are rejected.
+
+        Parameters
+        ----------
+        faces : list of MyFace, GEOM.FACE or wires
+
+        Returns
+        -------
+        Nr of faces which were added
+        """
+        face_index = self._getFaceIndex()
+        added = 0
+        for face in faces:
+            my_face = MyFace(face)
+            if self._findFace(my_face) is None:
+                face_index.setdefault(self._getFaceKey(my_face),[]).append(my_face)
+                self._faces[id(my_face)] = my_face
+                added += 1
+
+        if added > 0:
+            self._modified = True
+        return added
+
+    def removeFaces(self,faces):
+        """
+        Removes faces from the shell.
+
+        Parameters
+        ----------
+        faces : list of MyFace, GEOM.FACE or wires
+
+        Returns
+        -------
+        Nr of faces which were removed
+        """
+        face_index = self._getFaceIndex()
+        removed = 0
+        for face in faces:
+            found = self._findFace(MyFace(face))
+            if found is not None:
+                key, index = found
+                bucket = face_index[key]
+                del self._faces[id(bucket[index])]
+                del bucket[index]
+                if not bucket:
+                    del face_index[key]
+                removed += 1
+
+        if removed > 0:
+            self._modified = True
+        return removed
+
+    def getFaces(self):
+        """
+        Returns list of the MyFace instances of the shell
+        in the order they were added
+        """
+        self._getFaceIndex()
+        return list(self._faces.values())
+
+    def getNrOfFaces(self):
+        self._getFaceIndex()
+        return len(self._faces)
+
+    def finalize(self):
+        """
+        Builds the kernel shell if faces were added or removed
+        since the last build. If the shell has no faces its
+        geom object is None.
+        """
+        if self._modified:
+            face_list = [face.getGeomObject() for face in self.getFaces()]
+            if face_list:
+                self._geomObject = _register(geompy.MakeShell(face_list))
+                # the shell is reused beyond the current arena
+                _keep_in_active_arenas(self._geomObject)
+            else:
+                self._geomObject = None
+            self._modified = False
+        return self
+
+    def _getGeomObject(self):
+        self.finalize()
+        return self._geomObject
+
+    def _setGeomObject(self,geom_object):
+        self._geomObject = geom_object
+
+    # the kernel shell is built on first access
+    geomObject = property(_getGeomObject,_setGeomObject)
+
+
+class _IdentityKey(object):
+    """
+    Hashable wrapper which compares objects by identity. It holds a
+    reference to the object, so its id can not be reused while the
+    key exists.
+    """
+
+    def __init__(self,value):
+        self.value = value
+
+    def __eq__(self,other):
+        return isinstance(other,_IdentityKey) and self.value is other.value
+
+    def __ne__(self,other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return id(self.value)
+
+
+# tokens of the input states of all nodes, never reused
+_node_tokens = count()
+
+class MyGeomNode(object):
+    """
+    Node of a parametric MyGeom object graph.
+
+    A node stores a constructor, e.g. MyVertex, MyLine or MyFace, together
+    with the arguments it is called with. Arguments may be other nodes
+    (also inside lists and tuples), which makes the nodes a directed
+    acyclic graph. After changing arguments with setArguments, rebuild
+    only calls the constructors of nodes whose inputs changed. Results
+    are cached by the state of all upstream inputs, so returning to a
+    former variant reuses the former result. Results built inside a
+    MyGeomArena are kept by all active arenas.
+
+    Results which drop out of the cache are not removed from the kernel,
+    since results of other nodes may still be built from them. Use a
+    cache size which fits the number of variants, or release the objects
+    yourself after clearCache.
+
+    Examples
+    --------
+    p = MyGeomNode(MyVertex,0.0,0.0,0.0)
+    q = MyGeomNode(MyVertex,1.0,0.0,0.0)
+    r = MyGeomNode(MyVertex,0.0,1.0,0.0)
+    wire = MyGeomNode(MyWire,[MyGeomNode(MyLine,p,q),
+                              MyGeomNode(MyLine,q,r),
+                              MyGeomNode(MyLine,r,p)])
+    face = MyGeomNode(MyFace,wire)
+    face.rebuild()
+    q.setArguments(2.0,0.0,0.0)
+    new_face = face.rebuild()
+    """
+
+    def __init__(self,constructor,*args,**kwargs):
+        """
+        Parameters
+        ----------
+        constructor : callable which creates the object, e.g. a MyGeom class
+        args, kwargs : arguments of the constructor
+        cache_size : Nr of results which are cached, given as keyword.
+                     Default is 8
+        """
+        self._constructor = constructor
+        self._cache_size = kwargs.pop("cache_size",8)
+        self._cache = OrderedDict()
+        self._tokens = OrderedDict()
+        self._result = None
+        self._result_token = None
+        self._nr_of_builds = 0
+        self._visiting = False
+        self.setArguments(*args,**kwargs)
+
+    def setArguments(self,*args,**kwargs):
+        """
+        Replaces the arguments of the constructor. The object is
+        created on the next rebuild.
+        """
+        self._args = args
+        self._kwargs = kwargs
+
+    def getArguments(self):
+        return self._args, self._kwargs
+
+    def getInputs(self):
+        """
+        Returns list of the nodes this node directly depends on
+        """
+        inputs = []
+        def collect(value):
+            if isinstance(value,MyGeomNode):
+                if not any(value is node for node in inputs):
+                    inputs.append(value)
+            elif isinstance(value,list) or isinstance(value,tuple):
+                for item in value:
+                    collect(item)
+        collect(list(self._args) + list(self._kwargs.values()))
+        return inputs
+
+    def _makeKey(self,value,tokens):
+        """
+        Returns a hashable representation of an argument. Nodes are
+        represented by the token of their input state.
+        """
+        if isinstance(value,MyGeomNode):
+            return ("node", value._getToken(tokens))
+        elif isinstance(value,list) or isinstance(value,tuple):
+            return (type(value).__name__,) + tuple(self._makeKey(item,tokens) for item in value)
+        elif isinstance(value,ndarray):
+            return ("array", value.shape, value.dtype.str, value.tobytes())
+        elif isinstance(value,generic):
+            return value.item()
+        elif value is None or isinstance(value,(int,float,complex,str)):
+            return value
+        # geom objects and other references are only equal if identical
+        return _IdentityKey(value)
+
+    def _getToken(self,tokens):
+        """
+        Returns the token of the current input state of this node. The
+        key of the own arguments only contains the tokens of the input
+        nodes, so it is computed once per node and rebuild. Equal input
+        states get equal tokens as long as they are remembered; tokens
+        of different states are never equal. tokens memorizes the tokens
+        of nodes which were already visited during the current rebuild.
+        """
+        if id(self) in tokens:
+            return tokens[id(self)]
+        if self._visiting:
+            raise ValueError("Error: Cyclic dependency!")
+
+        self._visiting = True
+        try:
+            key = (self._makeKey(self._args,tokens),
+                   tuple(sorted((name, self._makeKey(value,tokens))
+                                for name, value in self._kwargs.items())))
+        finally:
+            self._visiting = False
+
+        token = self._tokens.get(key)
+        if token is None:
+            token = next(_node_tokens)
+            self._tokens[key] = token
+            # forgetting a state only costs a rebuild when it comes back
+            while len(self._tokens) > 4*self._cache_size + 4:
+                self._tokens.popitem(last = False)
+
+        tokens[id(self)] = token
+        return token
+
+    def _resolve(self,value,tokens,built):
+        if isinstance(value,MyGeomNode):
+            return value._rebuild(tokens,built)
+        elif isinstance(value,list) or isinstance(value,tuple):
+            return type(value)(self._resolve(item,tokens,built) for item in value)
+        return value
+
+    def _rebuild(self,tokens,built):
+        if id(self) in built:
+            return self._result
+
+        # upstream results are brought up to date also on a cache hit
+        args = self._resolve(self._args,tokens,built)
+        kwargs = dict((name, self._resolve(value,tokens,built))
+                      for name, value in self._kwargs.items())
+        token = self._getToken(tokens)
+
+        if token in self._cache:
+            self._result = self._cache[token]
+        else:
+            self._result = self._constructor(*args,**kwargs)
+            self._nr_of_builds += 1
+            # cached results have to survive all active arenas
+            _keep_in_active_arenas(self._result)
+
+            self._cache[token] = self._result
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last = False)
+
+        self._result_token = token
+        built.add(id(self))
+        return self._result
+
+    def rebuild(self):
+        """
+        Recomputes the object and all upstream objects whose inputs
+        have changed since they were built, and returns the result.
+        """
+        return self._rebuild({},set())
+
+    def getResult(self):
+        """
+        Returns the object for the current arguments. Builds it if
+        necessary.
+        """
+        if self._result is None or self._result_token != self._getToken({}):
+            return self.rebuild()
+        return self._result
+
+    def getNrOfBuilds(self):
+        """
+        Returns how often the constructor of this node was called
+        """
+        return self._nr_of_builds
+
+    def clearCache(self):
+        self._cache = OrderedDict()